@@ -2,42 +2,21 @@ import streamlit as st
 import pandas as pd
 import datetime
 import io
+import os
 import re
-import random
-from collections import Counter
+import multiprocessing
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from scheduler import (
+    SUBJECTS, get_open_periods, compile_problem, solve_schedule,
+    run_scenario, init_scenario_worker, run_scenario_in_worker,
+)
 
 # ==========================================
-# 1. カレンダー・ロジック設定
+# 1. Excel・入力データ処理
 # ==========================================
-def get_open_periods(date_obj):
-    """日付ごとの開講コマ定義"""
-    m, d = date_obj.month, date_obj.day
-
-    # 1. 1月7, 8, 9日は 3,4,5,6講
-    if m == 1 and d in [7, 8, 9]:
-        return [3, 4, 5, 6]
-
-    # 2. 12/23, 24は 3-6講
-    if m == 12 and d in [23, 24]:
-        return [3, 4, 5, 6]
-
-    # 3. 特定の日付の1,2講をバツにする
-    if (m == 12 and d in [20, 21, 27]) or (m == 1 and d in [4, 10, 11]):
-        return [3, 4, 5]
-    if (m == 12 and d in [25, 26]) or (m == 1 and d == 6):
-        return [3, 4, 5, 6]
-    if m == 12 and d == 28:
-        return [3, 4]
-
-    # 4. 通常ルール
-    if (m == 12 and (2<=d<=5 or 9<=d<=12 or 16<=d<=19)) or \
-       (m == 1 and (13<=d<=16 or 20<=d<=23 or 27<=d<=30)):
-        return [4, 5, 6]
-    
-    if (m == 12 and d in [6, 13]) or (m == 1 and d in [17, 24, 31]):
-        return [2, 3, 4, 5]
-
-    return []
 
 def parse_existing_excel(uploaded_file):
     """アップロードされたExcelから現在のschedule_mapを復元する"""
@@ -119,174 +98,53 @@ def apply_standard_schedule(target_weekly_data, standard_pattern):
     return updated_data
 
 # ==========================================
-# 2. データ処理・計算ロジック
+# 2. データ処理・計算ロジック (計算本体は scheduler.py)
 # ==========================================
-def calculate_schedule(teacher_weekly_data, req_df, student_weekly_data, teacher_name, existing_schedule_map=None):
-    
-    # A. 先生シフト解析
-    teacher_capacity = {}
-    
-    for week_label, df in teacher_weekly_data.items():
-        for date_str in df.columns:
-            match = re.search(r"(\d+)/(\d+)", date_str)
-            if not match: continue
-            m, d = int(match.group(1)), int(match.group(2))
-            y = 2025 if m == 12 else 2026
-            try: d_date = datetime.date(y, m, d)
-            except: continue
-            
-            open_periods = get_open_periods(d_date)
-            
-            for p in range(1, 7):
-                try: val = str(df.loc[p, date_str])
-                except: continue
-                
-                if p not in open_periods: continue
-                
-                if any(x in val for x in ["〇", "○", "OK", "全"]):
-                    teacher_capacity[(d_date, p)] = 2
-                elif any(x in val for x in ["△", "▲", "半", "1"]):
-                    teacher_capacity[(d_date, p)] = 1
-
-    # 全スロット作成
-    all_slots = []
-    for (d, p), cap in teacher_capacity.items():
-        all_slots.append((d, p, cap))
-    
-    # B. 生徒データ解析
-    students = {}
-    for _, row in req_df.iterrows():
-        name = row['生徒名']
-        reqs = {k: int(row.get(k, 0)) for k in ["国語", "数学", "英語", "理科", "社会"]}
-        students[name] = {"reqs": reqs, "remaining": sum(reqs.values())}
-
-    # C. 生徒シフト解析
-    student_availability = {}
-    for s_name, weekly_data in student_weekly_data.items():
-        if not weekly_data: continue
-        for week_label, df in weekly_data.items():
-            for date_str in df.columns:
-                match = re.search(r"(\d+)/(\d+)", date_str)
-                if not match: continue
-                m, d = int(match.group(1)), int(match.group(2))
-                y = 2025 if m == 12 else 2026
-                try: d_date = datetime.date(y, m, d)
-                except: continue
-                
-                for p in range(1, 7):
-                    try: val = str(df.loc[p, date_str])
-                    except: continue
-                    
-                    if any(x in val for x in ["〇", "○", "OK", "△", "▲", "1", "2", "3", "全"]):
-                        student_availability[(s_name, d_date, p)] = True
-                    else:
-                        student_availability[(s_name, d_date, p)] = False
-
-    # D. 計算準備
-    schedule_map = { (d, p): [] for d, p, cap in all_slots }
-    date_counts = Counter()
-    daily_student_counts = Counter()
-
-    if existing_schedule_map:
-        for (d, p), assigned_list in existing_schedule_map.items():
-            if (d, p) in schedule_map:
-                schedule_map[(d, p)] = assigned_list[:] 
-                if len(assigned_list) > 0:
-                    date_counts[d] += len(assigned_list)
-                for entry in assigned_list:
-                    s_name = entry.split("(")[0]
-                    daily_student_counts[(s_name, d)] += 1
-
-    random.seed(42)
-    max_loops = 3000
-    loop_count = 0
-
-    while loop_count < max_loops:
-        loop_count += 1
-        assigned_in_this_loop = False
-        
-        def get_slot_priority(slot):
-            d, p, cap = slot
-            current_assigned = schedule_map[(d, p)]
-            current_len = len(current_assigned)
-            
-            if current_len >= cap: return -99999
-            
-            score = 0
-            if current_len == 1 and cap == 2:
-                score += 5000 
+def calculate_schedule(teacher_weekly_data, req_df, student_weekly_data, teacher_name, existing_schedule_map=None, rules=None):
+    problem = compile_problem(teacher_weekly_data, req_df, student_weekly_data, rules)
+    return solve_schedule(problem, existing_schedule_map)
 
-            if len(schedule_map.get((d, p-1), [])) > 0: score += 100
-            if len(schedule_map.get((d, p+1), [])) > 0: score += 100
-            
-            score += date_counts[d] * 10
-            score += random.random()
-            return score
-
-        all_slots.sort(key=get_slot_priority, reverse=True)
-
-        for d, p, cap in all_slots:
-            current_assigned = schedule_map[(d, p)]
-            if len(current_assigned) >= cap: continue
-
-            candidates = []
-            for s_name, data in students.items():
-                if data["remaining"] <= 0: continue
-                if daily_student_counts[(s_name, d)] >= 3: continue 
-                if not student_availability.get((s_name, d, p), False): continue
-                
-                is_already_in = False
-                for entry in current_assigned:
-                    if entry.startswith(s_name + "("):
-                        is_already_in = True; break
-                if is_already_in: continue
-
-                candidates.append(s_name)
-            
-            if not candidates: continue
+# これより小さい計算量 (シナリオ数 × 希望コマ数 × コマ数) ならプールを起動せず順番に計算する
+PARALLEL_MIN_WORK = 1000000
 
-            def get_student_priority(s_name):
-                p_score = 0
-                prev_users = schedule_map.get((d, p-1), [])
-                for u in prev_users:
-                    if u.startswith(s_name + "("): p_score += 20000
-                
-                next_users = schedule_map.get((d, p+1), [])
-                for u in next_users:
-                    if u.startswith(s_name + "("): p_score += 20000
-
-                if daily_student_counts[(s_name, d)] > 0:
-                    p_score += 500
-                
-                p_score += students[s_name]["remaining"] * 10
-                p_score += random.random()
-                return p_score
-
-            candidates.sort(key=get_student_priority, reverse=True)
-            
-            s = candidates[0]
-            items = sorted([(v, k) for k, v in students[s]["reqs"].items() if v > 0], reverse=True)
-            if not items: continue
-            subj = items[0][1]
-
-            students[s]["reqs"][subj] -= 1
-            students[s]["remaining"] -= 1
-            daily_student_counts[(s, d)] += 1
-            date_counts[d] += 1
-            
-            schedule_map[(d, p)].append(f"{s}({subj})")
-            assigned_in_this_loop = True
-            break
-        
-        if not assigned_in_this_loop: break
-
-    all_dates = sorted(list(set([x[0] for x in all_slots])))
-    unscheduled = []
-    for s, data in students.items():
-        for subj, cnt in data["reqs"].items():
-            if cnt > 0: unscheduled.append({"生徒名": s, "科目": subj, "不足": cnt})
-    
-    return schedule_map, all_dates, unscheduled
+def evaluate_scenarios(problem, scenarios, existing_schedule_map=None, max_workers=None):
+    """
+    複数シナリオ [(名前, delta), ...] を並列に評価し、比較表の行リストを返す。
+    ベース問題は initializer でワーカーに1回だけ渡し、タスクとしては差分だけを受け渡す。
+    プールを起動・利用できない場合だけ逐次実行し、計算中の例外はそのまま送出する。
+    """
+    deltas = [delta for _, delta in scenarios]
+    workers = min(len(deltas), max_workers or os.cpu_count() or 1, os.cpu_count() or 1)
+    lessons = sum(sum(r.values()) for r in problem["reqs"].values())
+    work = len(deltas) * max(lessons, 1) * len(problem["capacity"])
+
+    summaries = None
+    if workers > 1 and work >= PARALLEL_MIN_WORK:
+        try:
+            with ProcessPoolExecutor(
+                max_workers=workers, mp_context=get_scenario_context(),
+                initializer=init_scenario_worker, initargs=(problem, existing_schedule_map),
+            ) as pool:
+                summaries = list(pool.map(run_scenario_in_worker, deltas))
+        except (BrokenProcessPool, OSError, pickle.PicklingError) as e:
+            st.warning(f"並列計算を開始できなかったため、順番に計算します: {e}")
+            summaries = None
+    if summaries is None:
+        summaries = [run_scenario(problem, existing_schedule_map, delta) for delta in deltas]
+
+    return [{"シナリオ": name, **summary} for (name, _), summary in zip(scenarios, summaries)]
+
+def get_scenario_context():
+    """
+    ワーカーの起動方式。サーバーのスレッドごと fork しないよう forkserver (なければ spawn) を使う。
+    multiprocessing は起動時にメインスクリプトを読み込むため、forkserver に1回だけ
+    事前 import させ (UI は __name__ ガードで実行されない)、ワーカーごとの再読み込みを避ける。
+    """
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        ctx = multiprocessing.get_context("forkserver")
+        ctx.set_forkserver_preload(["__main__", "scheduler"])
+        return ctx
+    return multiprocessing.get_context("spawn")
 
 # ==========================================
 # 3. UIヘルパー関数
@@ -324,357 +182,522 @@ def create_student_req_df(student_names):
         data.append({"生徒名": name, "国語": 0, "数学": 0, "英語": 0, "理科": 0, "社会": 0})
     return pd.DataFrame(data)
 
+def build_rules(max_per_day, max_subject_per_day, max_consecutive, max_days_per_week, ng_pair_text):
+    """サイドバーの入力値からルール定義を作る (0 は制限なし)"""
+    rules = [{"type": "max_per_day", "limit": max_per_day}]
+    if max_subject_per_day > 0: rules.append({"type": "max_subject_per_day", "limit": max_subject_per_day})
+    if max_consecutive > 0: rules.append({"type": "max_consecutive", "limit": max_consecutive})
+    if max_days_per_week > 0: rules.append({"type": "max_days_per_week", "limit": max_days_per_week})
+
+    pairs = []
+    for line in ng_pair_text.split('\n'):
+        names = [n.strip() for n in re.split(r"[,、，]", line) if n.strip()]
+        if len(names) == 2: pairs.append(names)
+    if pairs: rules.append({"type": "ng_pair", "pairs": pairs})
+    return rules
+
+BASE_SCENARIO_NAME = "ベース"
+SCENARIO_TYPES = ["希望数の増減", "生徒の休み", "生徒の追加空き", "コーチの休み", "コーチの定員"]
+
+def get_scenario_student_names(student_list, existing_schedule_map=None):
+    """シナリオで選べる生徒 (入力した生徒 + アップロードした時間割の既存生徒)"""
+    names = list(student_list)
+    for assigned_list in (existing_schedule_map or {}).values():
+        for entry in assigned_list:
+            s_name = entry.split("(")[0]
+            if s_name not in names: names.append(s_name)
+    return names
+
+def create_scenario_df(student_list=()):
+    s_name = student_list[0] if student_list else ""
+    return pd.DataFrame([
+        {"シナリオ名": "数学+3", "種類": "希望数の増減", "生徒名": s_name, "科目": "数学", "日付": "", "講": None, "数値": 3},
+    ])
+
+def build_scenarios(scenario_df):
+    """
+    シナリオ表 (1行=1変更) をシナリオ名ごとにまとめ、[(名前, delta), ...] に変換する。
+    先頭には変更なしの「ベース」を入れる (「ベース」はシナリオ名に使えない)。
+    戻り値: (シナリオのリスト, 読み飛ばした行の説明のリスト)
+    """
+    def cell_text(row, col):
+        val = row.get(col)
+        return "" if val is None or pd.isna(val) else str(val).strip()
+
+    scenarios = {}
+    skipped = []
+    for row_no, (_, row) in enumerate(scenario_df.iterrows(), start=1):
+        name = cell_text(row, "シナリオ名")
+        kind = row.get("種類")
+        if not name and pd.isna(kind): continue  # 空行
+        if name == BASE_SCENARIO_NAME:
+            raise ValueError(f"シナリオ名「{BASE_SCENARIO_NAME}」は比較の基準用のため使えません。別の名前にしてください。")
+        if not name:
+            skipped.append(f"{row_no}行目: シナリオ名がありません"); continue
+        if kind not in SCENARIO_TYPES:
+            skipped.append(f"{row_no}行目 ({name}): 種類を選んでください"); continue
+
+        s_name = cell_text(row, "生徒名")
+        value = 0 if pd.isna(row.get("数値")) else int(row.get("数値"))
+        if kind in ["希望数の増減", "生徒の休み", "生徒の追加空き"] and not s_name:
+            skipped.append(f"{row_no}行目 ({name}): 生徒名を選んでください"); continue
+
+        if kind == "希望数の増減":
+            subj = row.get("科目")
+            if subj not in SUBJECTS:
+                skipped.append(f"{row_no}行目 ({name}): 科目を選んでください"); continue
+            delta = scenarios.setdefault(name, {"reqs": {}, "availability": {}, "capacity": {}})
+            key = (s_name, subj)
+            delta["reqs"][key] = delta["reqs"].get(key, 0) + value
+            continue
+
+        date_text = cell_text(row, "日付")
+        match = re.search(r"(\d+)/(\d+)", date_text)
+        d_date = None
+        if match:
+            m, d = int(match.group(1)), int(match.group(2))
+            y = 2025 if m == 12 else 2026
+            try: d_date = datetime.date(y, m, d)
+            except: pass
+        if d_date is None:
+            skipped.append(f"{row_no}行目 ({name}): 日付「{date_text}」を読み取れません (例: 12/20)"); continue
+        periods = range(1, 7) if pd.isna(row.get("講")) else [int(row.get("講"))]
+
+        delta = scenarios.setdefault(name, {"reqs": {}, "availability": {}, "capacity": {}})
+        for p in periods:
+            if kind == "生徒の休み":
+                delta["availability"][(s_name, d_date, p)] = False
+            elif kind == "生徒の追加空き":
+                delta["availability"][(s_name, d_date, p)] = True
+            elif kind == "コーチの休み":
+                delta["capacity"][(d_date, p)] = 0
+            elif kind == "コーチの定員" and p in get_open_periods(d_date):
+                delta["capacity"][(d_date, p)] = max(0, min(2, value))
+    base = (BASE_SCENARIO_NAME, {"reqs": {}, "availability": {}, "capacity": {}})
+    return [base] + list(scenarios.items()), skipped
+
 # ==========================================
 # 4. メインアプリ (Streamlit)
 # ==========================================
-st.set_page_config(page_title="時間割作成", layout="wide")
-st.title("個別指導塾 時間割作成")
-
-# --- セッション状態の初期化 ---
-weeks_info = get_week_ranges()
-
-if "teacher_weekly_data" not in st.session_state: st.session_state.teacher_weekly_data = None
-if "student_req_df" not in st.session_state: st.session_state.student_req_df = None
-if "student_weekly_data" not in st.session_state: st.session_state.student_weekly_data = {}
-if "student_list" not in st.session_state: st.session_state.student_list = []
-if "existing_schedule_map" not in st.session_state: st.session_state.existing_schedule_map = None
-
-# --- サイドバー ---
-with st.sidebar:
-    st.header("1. 設定モード")
-    mode = st.radio("作成モードを選択", ["新規作成", "追加作成(更新)"])
-    
-    teacher_name = st.text_input("先生の名前", "佐藤")
-    
-    if mode == "追加作成(更新)":
-        st.info("前回のExcelファイルをアップロードしてください。")
-        uploaded_file = st.file_uploader("完成時間割Excel", type=["xlsx"])
-        if uploaded_file:
-            existing_map = parse_existing_excel(uploaded_file)
-            if existing_map:
-                st.session_state.existing_schedule_map = existing_map
-                st.success(f"既存データを読み込みました: {len(existing_map)}コマ分")
-            else:
-                st.error("データの読み込みに失敗しました。")
-        else:
-            st.session_state.existing_schedule_map = None
-    else:
-        st.session_state.existing_schedule_map = None
+def main():
+    st.set_page_config(page_title="時間割作成", layout="wide")
+    st.title("個別指導塾 時間割作成")
 
-    st.subheader("生徒リスト設定")
-    
-    default_students = "追加の生徒A\n追加の生徒B" if mode == "追加作成(更新)" else "山田くん\n田中さん\n高橋くん"
-    s_input = st.text_area("名前を入力 (改行区切り)", default_students, height=100)
-    
-    if st.button("入力を開始/リセット"):
-        new_list = [s.strip() for s in s_input.split('\n') if s.strip()]
-        st.session_state.student_list = new_list
-        
-        t_data = {}
-        for w in weeks_info: t_data[w["label"]] = create_weekly_df(w["dates"])
-        st.session_state.teacher_weekly_data = t_data
-        
-        st.session_state.student_req_df = create_student_req_df(new_list)
-        
-        s_data_all = {}
-        for s in new_list:
-            s_weeks = {}
-            for w in weeks_info: s_weeks[w["label"]] = create_weekly_df(w["dates"])
-            s_data_all[s] = s_weeks
-        st.session_state.student_weekly_data = s_data_all
-        st.success("生徒リストと設定をリセットしました。")
-
-# --- メインエリア ---
-if st.session_state.teacher_weekly_data is None:
-    st.info("👈 左のサイドバーで設定を行い、「入力を開始」ボタンを押してください。")
-else:
-    # モードに応じたタブ名と見出しの定義
-    if mode == "新規作成":
-        tab_names = ["📅 コーチシフト", "🔢 希望数", "🙋‍♂️ 生徒シフト", "🚀 作成＆結果"]
-        header_req = "希望コマ数"
-        header_shift = "生徒の行ける日時"
-    else:
-        tab_names = ["📅 コーチシフト(自動)", "🔢 追加希望数", "🙋‍♂️ 追加生徒シフト", "🚀 作成＆結果"]
-        header_req = "追加したいコマ数"
-        header_shift = "追加生徒の行ける日時"
+    # --- セッション状態の初期化 ---
+    weeks_info = get_week_ranges()
 
-    tab1, tab2, tab3, tab4 = st.tabs(tab_names)
+    if "teacher_weekly_data" not in st.session_state: st.session_state.teacher_weekly_data = None
+    if "student_req_df" not in st.session_state: st.session_state.student_req_df = None
+    if "student_weekly_data" not in st.session_state: st.session_state.student_weekly_data = {}
+    if "student_list" not in st.session_state: st.session_state.student_list = []
+    if "existing_schedule_map" not in st.session_state: st.session_state.existing_schedule_map = None
+    if "scenario_df" not in st.session_state: st.session_state.scenario_df = create_scenario_df()
+
+    # --- サイドバー ---
+    with st.sidebar:
+        st.header("1. 設定モード")
+        mode = st.radio("作成モードを選択", ["新規作成", "追加作成(更新)"])
+
+        teacher_name = st.text_input("先生の名前", "佐藤")
 
-    # =========================================
-    # Tab 1: コーチシフト
-    # =========================================
-    with tab1:
-        st.subheader(f"{teacher_name}コーチの予定")
-        
         if mode == "追加作成(更新)":
-            # === 追加作成モード: 入力スキップ ===
-            st.info("🔄 追加作成のため、コーチのシフト入力は不要です。")
-            st.write("「開講している空きコマ」に対して自動的に追加割り当てを行います。")
-            
-            # 裏側で自動的に「全開講」データをセットしておく
-            # (計算ロジックがteacher_weekly_dataを参照するため)
-            auto_teacher_data = {}
-            for w in weeks_info:
-                auto_teacher_data[w["label"]] = create_weekly_df(w["dates"])
-            st.session_state.teacher_weekly_data = auto_teacher_data
-            
-            st.success("✅ 設定完了 (自動)")
+            st.info("前回のExcelファイルをアップロードしてください。")
+            uploaded_file = st.file_uploader("完成時間割Excel", type=["xlsx"])
+            if uploaded_file:
+                existing_map = parse_existing_excel(uploaded_file)
+                if existing_map:
+                    st.session_state.existing_schedule_map = existing_map
+                    st.success(f"既存データを読み込みました: {len(existing_map)}コマ分")
+                else:
+                    st.error("データの読み込みに失敗しました。")
+            else:
+                st.session_state.existing_schedule_map = None
+        else:
+            st.session_state.existing_schedule_map = None
 
+        st.subheader("生徒リスト設定")
+
+        default_students = "追加の生徒A\n追加の生徒B" if mode == "追加作成(更新)" else "山田くん\n田中さん\n高橋くん"
+        s_input = st.text_area("名前を入力 (改行区切り)", default_students, height=100)
+
+        if st.button("入力を開始/リセット"):
+            new_list = [s.strip() for s in s_input.split('\n') if s.strip()]
+            st.session_state.student_list = new_list
+
+            t_data = {}
+            for w in weeks_info: t_data[w["label"]] = create_weekly_df(w["dates"])
+            st.session_state.teacher_weekly_data = t_data
+
+            st.session_state.student_req_df = create_student_req_df(new_list)
+            st.session_state.scenario_df = create_scenario_df(new_list)
+
+            s_data_all = {}
+            for s in new_list:
+                s_weeks = {}
+                for w in weeks_info: s_weeks[w["label"]] = create_weekly_df(w["dates"])
+                s_data_all[s] = s_weeks
+            st.session_state.student_weekly_data = s_data_all
+            st.success("生徒リストと設定をリセットしました。")
+
+        st.subheader("ルール設定")
+        with st.expander("⚙️ 割当ルール (クリックで開く)"):
+            st.caption("0 は「制限なし」です。")
+            rule_max_per_day = st.number_input("1日の最大コマ数 (生徒ごと)", min_value=1, max_value=6, value=3)
+            rule_max_subject = st.number_input("同じ科目の1日の最大コマ数", min_value=0, max_value=6, value=0)
+            rule_max_consecutive = st.number_input("連続コマの上限 (超える場合は空きコマを挟む)", min_value=0, max_value=6, value=0)
+            rule_max_days = st.number_input("1週間の最大通塾日数", min_value=0, max_value=7, value=0)
+            rule_ng_pairs = st.text_area("同じコマにしない生徒 (1行に「生徒A,生徒B」)", "", height=80)
+        rules = build_rules(rule_max_per_day, rule_max_subject, rule_max_consecutive, rule_max_days, rule_ng_pairs)
+
+    # --- メインエリア ---
+    if st.session_state.teacher_weekly_data is None:
+        st.info("👈 左のサイドバーで設定を行い、「入力を開始」ボタンを押してください。")
+    else:
+        # モードに応じたタブ名と見出しの定義
+        if mode == "新規作成":
+            tab_names = ["📅 コーチシフト", "🔢 希望数", "🙋‍♂️ 生徒シフト", "🚀 作成＆結果", "🔍 シナリオ比較"]
+            header_req = "希望コマ数"
+            header_shift = "生徒の行ける日時"
         else:
-            # === 新規作成モード: 通常の手動入力 ===
-            with st.expander("⚡ 通常授業パターンから一括入力 (クリックで開く)"):
-                st.write("通常授業の曜日・時間帯のみ表示しています。")
-                st.write("「△」＝通常授業片配、「×」＝通常授業両配")
-                st.caption("「適用」を押すと、冬期講習期間(12/24-1/5)以外の日付に反映されます。")
-                
-                weekdays_t = ["月", "火", "水", "木", "金", "土"]
-                display_days = [1, 2, 3, 4, 5] # 火〜土
-                valid_slots = {
-                    1: [4, 5, 6], 2: [4, 5, 6], 3: [4, 5, 6], 4: [4, 5, 6], 
-                    5: [2, 3, 4, 5]
-                }
-                options = ["×", "〇", "△"]
-                std_pattern_t = {d: [None]*6 for d in display_days} 
-
-                cols = st.columns([0.6] + [1]*5)
-                cols[0].write("時間")
-                for i, d_idx in enumerate(display_days):
-                    cols[i+1].write(f"**{weekdays_t[d_idx]}**")
-                
-                for p in range(1, 7):
-                    row_cols = st.columns([0.6] + [1]*5)
-                    row_cols[0].write(f"**{p}講**")
-                    
-                    for i, d_idx in enumerate(display_days):
-                        with row_cols[i+1]:
-                            if p in valid_slots[d_idx]:
-                                val = st.selectbox(
-                                    f"t_{d_idx}_{p}", options, index=1, 
-                                    key=f"std_teacher_{d_idx}_{p}", label_visibility="collapsed"
-                                )
-                                std_pattern_t[d_idx][p-1] = val
-                            else:
-                                st.write("-")
-
-                if st.button("⚡ 先生のシフトに通常パターンを適用"):
-                    current_data = st.session_state.teacher_weekly_data
-                    new_data = apply_standard_schedule(current_data, std_pattern_t)
-                    st.session_state.teacher_weekly_data = new_data
-                    st.success("先生のシフトに通常パターンを適用しました！ (12/24-1/5は変更していません)")
-                    st.rerun()
-            st.divider()
-
-            st.info("💡 個別の変更は以下のカレンダーで行い、最後に「保存」ボタンを押してください。")
-            st.write("「〇」＝両配可、「△」＝片配可、「×」＝NG")
-            
-            with st.form("teacher_form"):
-                updated_weekly_data = {}
+            tab_names = ["📅 コーチシフト(自動)", "🔢 追加希望数", "🙋‍♂️ 追加生徒シフト", "🚀 作成＆結果", "🔍 シナリオ比較"]
+            header_req = "追加したいコマ数"
+            header_shift = "追加生徒の行ける日時"
+
+        tab1, tab2, tab3, tab4, tab5 = st.tabs(tab_names)
+
+        # =========================================
+        # Tab 1: コーチシフト
+        # =========================================
+        with tab1:
+            st.subheader(f"{teacher_name}コーチの予定")
+
+            if mode == "追加作成(更新)":
+                # === 追加作成モード: 入力スキップ ===
+                st.info("🔄 追加作成のため、コーチのシフト入力は不要です。")
+                st.write("「開講している空きコマ」に対して自動的に追加割り当てを行います。")
+
+                # 裏側で自動的に「全開講」データをセットしておく
+                # (計算ロジックがteacher_weekly_dataを参照するため)
+                auto_teacher_data = {}
                 for w in weeks_info:
-                    label = w["label"]
-                    st.write(f"**{label}**")
-                    df = st.session_state.teacher_weekly_data[label]
-                    column_config = {}
-                    options = ["〇", "×", "△"]
-                    for col in df.columns:
-                        column_config[col] = st.column_config.SelectboxColumn(col, options=options, width="small", required=True)
-                    edited_df = st.data_editor(
-                        df, column_config=column_config, use_container_width=True, key=f"teacher_edit_{label}", height=300
-                    )
-                    updated_weekly_data[label] = edited_df
-                    st.divider()
-                
-                submitted = st.form_submit_button("💾 入力内容を保存する", type="primary")
-                if submitted:
-                    st.session_state.teacher_weekly_data = updated_weekly_data
-                    st.success(f"{teacher_name}コーチのシフトを保存しました！")
-
-    # --- Tab 2: 生徒希望数 ---
-    with tab2:
-        st.subheader(header_req)
-        st.info("💡 入力後に必ず下の「保存」ボタンを押してください。")
-        with st.form("req_form"):
-            edited_req_df = st.data_editor(
-                st.session_state.student_req_df, hide_index=True, use_container_width=True
-            )
-            submitted_req = st.form_submit_button("💾 希望数を保存する", type="primary")
-            if submitted_req:
-                st.session_state.student_req_df = edited_req_df
-                st.success("生徒の希望数を保存しました！")
-
-    # =========================================
-    # Tab 3: 生徒シフト
-    # =========================================
-    with tab3:
-        st.subheader(header_shift)
-        target_student = st.selectbox("生徒を選択してください", st.session_state.student_list)
-        
-        if target_student:
-            with st.expander("⚡ 通常授業パターンから一括入力 (クリックで開く)"):
-                st.write("通常授業の曜日・時間帯のみ表示しています。")
-                st.write("「〇」＝通常授業なし、「×」＝通常授業あり")
-                st.caption("「適用」を押すと、冬期講習期間(12/24-1/5)以外の日付に反映されます。")
-                
-                weekdays = ["月", "火", "水", "木", "金", "土"]
-                display_days = [1, 2, 3, 4, 5] # 火〜土
-                valid_slots = {
-                    1: [4, 5, 6], 2: [4, 5, 6], 3: [4, 5, 6], 4: [4, 5, 6], 
-                    5: [2, 3, 4, 5]
-                }
-                options = ["×", "〇"]
-                std_pattern = {d: [None]*6 for d in display_days}
-
-                # --- ヘッダー ---
-                cols = st.columns([0.6] + [1]*5)
-                cols[0].write("時間")
-                for i, d_idx in enumerate(display_days):
-                    cols[i+1].write(f"**{weekdays[d_idx]}**")
-
-                # --- 1〜6講ループ ---
-                for p in range(1, 7):
-                    row_cols = st.columns([0.6] + [1]*5)
-                    row_cols[0].write(f"**{p}講**")
-                    
-                    for i, d_idx in enumerate(display_days):
-                        with row_cols[i+1]:
-                            if p in valid_slots[d_idx]:
-                                val = st.selectbox(
-                                    f"s_{target_student}_{d_idx}_{p}", options, index=1,
-                                    key=f"std_{target_student}_{d_idx}_{p}", label_visibility="collapsed"
-                                )
-                                std_pattern[d_idx][p-1] = val
-                            else:
-                                st.write("-")
+                    auto_teacher_data[w["label"]] = create_weekly_df(w["dates"])
+                st.session_state.teacher_weekly_data = auto_teacher_data
 
-                if st.button(f"⚡ {target_student} の通常パターンを適用"):
-                    current_data = st.session_state.student_weekly_data[target_student]
-                    new_data = apply_standard_schedule(current_data, std_pattern)
-                    st.session_state.student_weekly_data[target_student] = new_data
-                    st.success(f"{target_student} の通常期間にパターンを適用しました！ (12/24-1/5は変更していません)")
-                    st.rerun()
+                st.success("✅ 設定完了 (自動)")
 
-            st.divider()
-
-            st.caption(f"{target_student} の行ける時間 (〇, △ = OK / × = NG)")
-            st.info("💡 個別の変更は以下のカレンダーで行い、最後に「保存」ボタンを押してください。")
-            st.write("「〇」＝空き、「×」＝NG")
-            
-            with st.form(f"student_form_{target_student}"):
-                updated_s_weekly = {}
-                for w in weeks_info:
-                    label = w["label"]
-                    st.write(f"**{label}**")
-                    s_df = st.session_state.student_weekly_data[target_student][label]
-                    column_config_s = {}
-                    options = ["〇", "×"]
-                    for col in s_df.columns:
-                        column_config_s[col] = st.column_config.SelectboxColumn(col, options=options, width="small", required=True)
-                    edited_s_df = st.data_editor(
-                        s_df, column_config=column_config_s, use_container_width=True,
-                        key=f"student_edit_{target_student}_{label}", height=300
-                    )
-                    updated_s_weekly[label] = edited_s_df
-                    st.divider()
-                
-                submitted_s = st.form_submit_button(f"💾 {target_student} のシフトを保存する", type="primary")
-                if submitted_s:
-                    st.session_state.student_weekly_data[target_student] = updated_s_weekly
-                    st.success(f"{target_student} のシフトを保存しました！")
-
-    # --- Tab 4: 作成実行 & 結果表示 ---
-    with tab4:
-        st.subheader("時間割作成")
-        
-        if mode == "追加作成(更新)" and st.session_state.existing_schedule_map is None:
-            st.error("⛔ Excelファイルがアップロードされていません。サイドバーからアップロードしてください。")
-        else:
-            if st.button("🚀 作成スタート", type="primary"):
-                with st.spinner("計算中..."):
-                    try:
-                        schedule_map, all_dates, unscheduled = calculate_schedule(
-                            st.session_state.teacher_weekly_data,
-                            st.session_state.student_req_df,
-                            st.session_state.student_weekly_data,
-                            teacher_name,
-                            existing_schedule_map=st.session_state.existing_schedule_map
+            else:
+                # === 新規作成モード: 通常の手動入力 ===
+                with st.expander("⚡ 通常授業パターンから一括入力 (クリックで開く)"):
+                    st.write("通常授業の曜日・時間帯のみ表示しています。")
+                    st.write("「△」＝通常授業片配、「×」＝通常授業両配")
+                    st.caption("「適用」を押すと、冬期講習期間(12/24-1/5)以外の日付に反映されます。")
+
+                    weekdays_t = ["月", "火", "水", "木", "金", "土"]
+                    display_days = [1, 2, 3, 4, 5] # 火〜土
+                    valid_slots = {
+                        1: [4, 5, 6], 2: [4, 5, 6], 3: [4, 5, 6], 4: [4, 5, 6], 
+                        5: [2, 3, 4, 5]
+                    }
+                    options = ["×", "〇", "△"]
+                    std_pattern_t = {d: [None]*6 for d in display_days} 
+
+                    cols = st.columns([0.6] + [1]*5)
+                    cols[0].write("時間")
+                    for i, d_idx in enumerate(display_days):
+                        cols[i+1].write(f"**{weekdays_t[d_idx]}**")
+
+                    for p in range(1, 7):
+                        row_cols = st.columns([0.6] + [1]*5)
+                        row_cols[0].write(f"**{p}講**")
+
+                        for i, d_idx in enumerate(display_days):
+                            with row_cols[i+1]:
+                                if p in valid_slots[d_idx]:
+                                    val = st.selectbox(
+                                        f"t_{d_idx}_{p}", options, index=1, 
+                                        key=f"std_teacher_{d_idx}_{p}", label_visibility="collapsed"
+                                    )
+                                    std_pattern_t[d_idx][p-1] = val
+                                else:
+                                    st.write("-")
+
+                    if st.button("⚡ 先生のシフトに通常パターンを適用"):
+                        current_data = st.session_state.teacher_weekly_data
+                        new_data = apply_standard_schedule(current_data, std_pattern_t)
+                        st.session_state.teacher_weekly_data = new_data
+                        st.success("先生のシフトに通常パターンを適用しました！ (12/24-1/5は変更していません)")
+                        st.rerun()
+                st.divider()
+
+                st.info("💡 個別の変更は以下のカレンダーで行い、最後に「保存」ボタンを押してください。")
+                st.write("「〇」＝両配可、「△」＝片配可、「×」＝NG")
+
+                with st.form("teacher_form"):
+                    updated_weekly_data = {}
+                    for w in weeks_info:
+                        label = w["label"]
+                        st.write(f"**{label}**")
+                        df = st.session_state.teacher_weekly_data[label]
+                        column_config = {}
+                        options = ["〇", "×", "△"]
+                        for col in df.columns:
+                            column_config[col] = st.column_config.SelectboxColumn(col, options=options, width="small", required=True)
+                        edited_df = st.data_editor(
+                            df, column_config=column_config, use_container_width=True, key=f"teacher_edit_{label}", height=300
                         )
-                        
-                        st.success("✅ 完成しました！ 結果は以下に表示されます。")
-                        
-                        # === A. 画面表示 ===
+                        updated_weekly_data[label] = edited_df
                         st.divider()
-                        st.subheader("📅 完成時間割プレビュー")
-                        
-                        start_date = datetime.date(2025, 12, 1)
-                        end_date = datetime.date(2026, 1, 31)
-                        cal_dates = []
-                        curr = start_date
-                        while curr <= end_date:
-                            cal_dates.append(curr)
-                            curr += datetime.timedelta(days=1)
-
-                        for i in range(0, len(cal_dates), 7):
-                            week_dates = cal_dates[i : i+7]
-                            week_data = {}
-                            col_names = [d.strftime("%m/%d(%a)") for d in week_dates]
-                            col_config = {}
-
-                            for d_obj, col in zip(week_dates, col_names):
-                                col_config[col] = st.column_config.TextColumn(col, width="medium")
-                                col_content = []
-                                for p in range(1, 7):
-                                    assigned = schedule_map.get((d_obj, p), [])
-                                    if assigned:
-                                        col_content.append(", ".join(assigned))
-                                    else:
-                                        open_periods = get_open_periods(d_obj)
-                                        col_content.append("-" if p in open_periods else "×")
-                                week_data[col] = col_content
-                            
-                            df_week_view = pd.DataFrame(week_data, index=[f"{p}講" for p in range(1, 7)])
-                            st.write(f"**{week_dates[0].strftime('%Y/%m/%d')} 週**")
-                            st.dataframe(df_week_view, column_config=col_config, use_container_width=True)
-                            st.write("") 
-
-                        if unscheduled:
-                            st.error("⚠️ 入りきらなかった授業があります")
-                            st.dataframe(pd.DataFrame(unscheduled), hide_index=True)
-                        else:
-                            st.info("🎉 全ての授業が割り当てられました！")
-
-                        # === B. Excel出力 ===
+
+                    submitted = st.form_submit_button("💾 入力内容を保存する", type="primary")
+                    if submitted:
+                        st.session_state.teacher_weekly_data = updated_weekly_data
+                        st.success(f"{teacher_name}コーチのシフトを保存しました！")
+
+        # --- Tab 2: 生徒希望数 ---
+        with tab2:
+            st.subheader(header_req)
+            st.info("💡 入力後に必ず下の「保存」ボタンを押してください。")
+            with st.form("req_form"):
+                edited_req_df = st.data_editor(
+                    st.session_state.student_req_df, hide_index=True, use_container_width=True
+                )
+                submitted_req = st.form_submit_button("💾 希望数を保存する", type="primary")
+                if submitted_req:
+                    st.session_state.student_req_df = edited_req_df
+                    st.success("生徒の希望数を保存しました！")
+
+        # =========================================
+        # Tab 3: 生徒シフト
+        # =========================================
+        with tab3:
+            st.subheader(header_shift)
+            target_student = st.selectbox("生徒を選択してください", st.session_state.student_list)
+
+            if target_student:
+                with st.expander("⚡ 通常授業パターンから一括入力 (クリックで開く)"):
+                    st.write("通常授業の曜日・時間帯のみ表示しています。")
+                    st.write("「〇」＝通常授業なし、「×」＝通常授業あり")
+                    st.caption("「適用」を押すと、冬期講習期間(12/24-1/5)以外の日付に反映されます。")
+
+                    weekdays = ["月", "火", "水", "木", "金", "土"]
+                    display_days = [1, 2, 3, 4, 5] # 火〜土
+                    valid_slots = {
+                        1: [4, 5, 6], 2: [4, 5, 6], 3: [4, 5, 6], 4: [4, 5, 6], 
+                        5: [2, 3, 4, 5]
+                    }
+                    options = ["×", "〇"]
+                    std_pattern = {d: [None]*6 for d in display_days}
+
+                    # --- ヘッダー ---
+                    cols = st.columns([0.6] + [1]*5)
+                    cols[0].write("時間")
+                    for i, d_idx in enumerate(display_days):
+                        cols[i+1].write(f"**{weekdays[d_idx]}**")
+
+                    # --- 1〜6講ループ ---
+                    for p in range(1, 7):
+                        row_cols = st.columns([0.6] + [1]*5)
+                        row_cols[0].write(f"**{p}講**")
+
+                        for i, d_idx in enumerate(display_days):
+                            with row_cols[i+1]:
+                                if p in valid_slots[d_idx]:
+                                    val = st.selectbox(
+                                        f"s_{target_student}_{d_idx}_{p}", options, index=1,
+                                        key=f"std_{target_student}_{d_idx}_{p}", label_visibility="collapsed"
+                                    )
+                                    std_pattern[d_idx][p-1] = val
+                                else:
+                                    st.write("-")
+
+                    if st.button(f"⚡ {target_student} の通常パターンを適用"):
+                        current_data = st.session_state.student_weekly_data[target_student]
+                        new_data = apply_standard_schedule(current_data, std_pattern)
+                        st.session_state.student_weekly_data[target_student] = new_data
+                        st.success(f"{target_student} の通常期間にパターンを適用しました！ (12/24-1/5は変更していません)")
+                        st.rerun()
+
+                st.divider()
+
+                st.caption(f"{target_student} の行ける時間 (〇, △ = OK / × = NG)")
+                st.info("💡 個別の変更は以下のカレンダーで行い、最後に「保存」ボタンを押してください。")
+                st.write("「〇」＝空き、「×」＝NG")
+
+                with st.form(f"student_form_{target_student}"):
+                    updated_s_weekly = {}
+                    for w in weeks_info:
+                        label = w["label"]
+                        st.write(f"**{label}**")
+                        s_df = st.session_state.student_weekly_data[target_student][label]
+                        column_config_s = {}
+                        options = ["〇", "×"]
+                        for col in s_df.columns:
+                            column_config_s[col] = st.column_config.SelectboxColumn(col, options=options, width="small", required=True)
+                        edited_s_df = st.data_editor(
+                            s_df, column_config=column_config_s, use_container_width=True,
+                            key=f"student_edit_{target_student}_{label}", height=300
+                        )
+                        updated_s_weekly[label] = edited_s_df
                         st.divider()
-                        output = io.BytesIO()
-                        with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-                            workbook = writer.book
-                            worksheet = workbook.add_worksheet("時間割")
-                            writer.sheets["時間割"] = worksheet
-                            wrap_fmt = workbook.add_format({'text_wrap': True, 'valign': 'top', 'border': 1, 'align': 'center'})
-                            header_fmt = workbook.add_format({'bold': True, 'bg_color': '#D9E1F2', 'border': 1, 'align': 'center'})
-                            
-                            current_row = 0
+
+                    submitted_s = st.form_submit_button(f"💾 {target_student} のシフトを保存する", type="primary")
+                    if submitted_s:
+                        st.session_state.student_weekly_data[target_student] = updated_s_weekly
+                        st.success(f"{target_student} のシフトを保存しました！")
+
+        # --- Tab 4: 作成実行 & 結果表示 ---
+        with tab4:
+            st.subheader("時間割作成")
+
+            if mode == "追加作成(更新)" and st.session_state.existing_schedule_map is None:
+                st.error("⛔ Excelファイルがアップロードされていません。サイドバーからアップロードしてください。")
+            else:
+                if st.button("🚀 作成スタート", type="primary"):
+                    with st.spinner("計算中..."):
+                        try:
+                            schedule_map, all_dates, unscheduled = calculate_schedule(
+                                st.session_state.teacher_weekly_data,
+                                st.session_state.student_req_df,
+                                st.session_state.student_weekly_data,
+                                teacher_name,
+                                existing_schedule_map=st.session_state.existing_schedule_map,
+                                rules=rules
+                            )
+
+                            st.success("✅ 完成しました！ 結果は以下に表示されます。")
+
+                            # === A. 画面表示 ===
+                            st.divider()
+                            st.subheader("📅 完成時間割プレビュー")
+
+                            start_date = datetime.date(2025, 12, 1)
+                            end_date = datetime.date(2026, 1, 31)
+                            cal_dates = []
+                            curr = start_date
+                            while curr <= end_date:
+                                cal_dates.append(curr)
+                                curr += datetime.timedelta(days=1)
+
                             for i in range(0, len(cal_dates), 7):
                                 week_dates = cal_dates[i : i+7]
-                                worksheet.write(current_row, 0, "講", header_fmt)
-                                for col_idx, d_obj in enumerate(week_dates):
-                                    worksheet.write(current_row, col_idx + 1, d_obj.strftime("%m/%d(%a)"), header_fmt)
-                                for p in range(1, 7):
-                                    row_idx = current_row + p
-                                    worksheet.write(row_idx, 0, p, wrap_fmt)
-                                    for col_idx, d_obj in enumerate(week_dates):
+                                week_data = {}
+                                col_names = [d.strftime("%m/%d(%a)") for d in week_dates]
+                                col_config = {}
+
+                                for d_obj, col in zip(week_dates, col_names):
+                                    col_config[col] = st.column_config.TextColumn(col, width="medium")
+                                    col_content = []
+                                    for p in range(1, 7):
                                         assigned = schedule_map.get((d_obj, p), [])
-                                        cell_text = "\n".join(assigned) if assigned else ("" if p in get_open_periods(d_obj) else "×")
-                                        worksheet.write(row_idx, col_idx + 1, cell_text, wrap_fmt)
-                                current_row += 8
-                            worksheet.set_column(0, 0, 5); worksheet.set_column(1, 7, 18)
-                            
-                            if unscheduled: pd.DataFrame(unscheduled).to_excel(writer, sheet_name="未消化リスト", index=False)
-
-                        st.download_button(
-                            label="📥 結果をExcelで保存",
-                            data=output.getvalue(),
-                            file_name=f"完成時間割_{teacher_name}_{datetime.date.today()}.xlsx",
-                            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                        )
-
-                    except Exception as e:
-                        st.error(f"エラーが発生しました: {e}")
\ No newline at end of file
+                                        if assigned:
+                                            col_content.append(", ".join(assigned))
+                                        else:
+                                            open_periods = get_open_periods(d_obj)
+                                            col_content.append("-" if p in open_periods else "×")
+                                    week_data[col] = col_content
+
+                                df_week_view = pd.DataFrame(week_data, index=[f"{p}講" for p in range(1, 7)])
+                                st.write(f"**{week_dates[0].strftime('%Y/%m/%d')} 週**")
+                                st.dataframe(df_week_view, column_config=col_config, use_container_width=True)
+                                st.write("") 
+
+                            if unscheduled:
+                                st.error("⚠️ 入りきらなかった授業があります")
+                                st.dataframe(pd.DataFrame(unscheduled), hide_index=True)
+                            else:
+                                st.info("🎉 全ての授業が割り当てられました！")
+
+                            # === B. Excel出力 ===
+                            st.divider()
+                            output = io.BytesIO()
+                            with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
+                                workbook = writer.book
+                                worksheet = workbook.add_worksheet("時間割")
+                                writer.sheets["時間割"] = worksheet
+                                wrap_fmt = workbook.add_format({'text_wrap': True, 'valign': 'top', 'border': 1, 'align': 'center'})
+                                header_fmt = workbook.add_format({'bold': True, 'bg_color': '#D9E1F2', 'border': 1, 'align': 'center'})
+
+                                current_row = 0
+                                for i in range(0, len(cal_dates), 7):
+                                    week_dates = cal_dates[i : i+7]
+                                    worksheet.write(current_row, 0, "講", header_fmt)
+                                    for col_idx, d_obj in enumerate(week_dates):
+                                        worksheet.write(current_row, col_idx + 1, d_obj.strftime("%m/%d(%a)"), header_fmt)
+                                    for p in range(1, 7):
+                                        row_idx = current_row + p
+                                        worksheet.write(row_idx, 0, p, wrap_fmt)
+                                        for col_idx, d_obj in enumerate(week_dates):
+                                            assigned = schedule_map.get((d_obj, p), [])
+                                            cell_text = "\n".join(assigned) if assigned else ("" if p in get_open_periods(d_obj) else "×")
+                                            worksheet.write(row_idx, col_idx + 1, cell_text, wrap_fmt)
+                                    current_row += 8
+                                worksheet.set_column(0, 0, 5); worksheet.set_column(1, 7, 18)
+
+                                if unscheduled: pd.DataFrame(unscheduled).to_excel(writer, sheet_name="未消化リスト", index=False)
+
+                            st.download_button(
+                                label="📥 結果をExcelで保存",
+                                data=output.getvalue(),
+                                file_name=f"完成時間割_{teacher_name}_{datetime.date.today()}.xlsx",
+                                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                            )
+
+                        except Exception as e:
+                            st.error(f"エラーが発生しました: {e}")
+
+        # =========================================
+        # Tab 5: シナリオ比較 (What-if)
+        # =========================================
+        with tab5:
+            st.subheader("シナリオ比較")
+            st.info("💡 「〇〇くんが数学をあと3コマ増やせるか」「コーチが1日休んだら」などを、入力を書き換えずにまとめて試算します。")
+            st.write("1行＝1つの変更です。同じシナリオ名の行はまとめて適用されます。")
+            st.caption("日付は「12/20」の形式、講を空欄にするとその日の全コマが対象です。「数値」は希望数の増減、またはコーチの定員(0〜2)です。")
+            if mode == "追加作成(更新)":
+                st.caption("既存の授業はそのまま固定します。コーチや生徒の休みで入れなくなった既存授業は「移動が必要な既存授業」に数え、割当コマ数からは除きます。")
+
+            scenario_students = get_scenario_student_names(
+                st.session_state.student_list, st.session_state.existing_schedule_map
+            )
+            with st.form("scenario_form"):
+                edited_scenario_df = st.data_editor(
+                    st.session_state.scenario_df, num_rows="dynamic", hide_index=True, use_container_width=True,
+                    column_config={
+                        "種類": st.column_config.SelectboxColumn("種類", options=SCENARIO_TYPES, required=True),
+                        "生徒名": st.column_config.SelectboxColumn("生徒名", options=scenario_students),
+                        "科目": st.column_config.SelectboxColumn("科目", options=SUBJECTS),
+                        "講": st.column_config.NumberColumn("講", min_value=1, max_value=6, step=1),
+                        "数値": st.column_config.NumberColumn("数値", step=1),
+                    },
+                )
+                submitted_scenario = st.form_submit_button("🔍 シナリオを比較する", type="primary")
+
+            if submitted_scenario:
+                st.session_state.scenario_df = edited_scenario_df
+                if mode == "追加作成(更新)" and st.session_state.existing_schedule_map is None:
+                    st.error("⛔ Excelファイルがアップロードされていません。サイドバーからアップロードしてください。")
+                else:
+                    with st.spinner("シナリオを計算中..."):
+                        try:
+                            problem = compile_problem(
+                                st.session_state.teacher_weekly_data,
+                                st.session_state.student_req_df,
+                                st.session_state.student_weekly_data,
+                                rules,
+                            )
+                            scenarios, skipped = build_scenarios(edited_scenario_df)
+                            if skipped:
+                                st.warning("⚠️ 次の行は読み飛ばしました:\n\n" + "\n".join(f"- {msg}" for msg in skipped))
+                            rows = evaluate_scenarios(problem, scenarios, st.session_state.existing_schedule_map)
+
+                            result_df = pd.DataFrame(rows)
+                            base = result_df.iloc[0]
+                            result_df["割当の差(対ベース)"] = result_df["割当コマ数"] - base["割当コマ数"]
+                            st.dataframe(result_df, hide_index=True, use_container_width=True)
+                        except Exception as e:
+                            st.error(f"エラーが発生しました: {e}")
+
+# Streamlit からは __main__ として実行される。シナリオ比較のワーカー起動時に
+# multiprocessing がこのファイルを __mp_main__ として読み込んでも UI は実行しない。
+if __name__ == "__main__":
+    main()
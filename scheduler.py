@@ -0,0 +1,409 @@
+# ==========================================
+# 時間割の計算エンジン
+# Streamlit に依存しないので、シナリオ比較のワーカープロセスからも import できる。
+# ==========================================
+import datetime
+import re
+import random
+from collections import Counter
+
+# ==========================================
+# 1. カレンダー・ロジック設定
+# ==========================================
+SUBJECTS = ["国語", "数学", "英語", "理科", "社会"]
+
+def get_open_periods(date_obj):
+    """日付ごとの開講コマ定義"""
+    m, d = date_obj.month, date_obj.day
+
+    # 1. 1月7, 8, 9日は 3,4,5,6講
+    if m == 1 and d in [7, 8, 9]:
+        return [3, 4, 5, 6]
+
+    # 2. 12/23, 24は 3-6講
+    if m == 12 and d in [23, 24]:
+        return [3, 4, 5, 6]
+
+    # 3. 特定の日付の1,2講をバツにする
+    if (m == 12 and d in [20, 21, 27]) or (m == 1 and d in [4, 10, 11]):
+        return [3, 4, 5]
+    if (m == 12 and d in [25, 26]) or (m == 1 and d == 6):
+        return [3, 4, 5, 6]
+    if m == 12 and d == 28:
+        return [3, 4]
+
+    # 4. 通常ルール
+    if (m == 12 and (2<=d<=5 or 9<=d<=12 or 16<=d<=19)) or \
+       (m == 1 and (13<=d<=16 or 20<=d<=23 or 27<=d<=30)):
+        return [4, 5, 6]
+    
+    if (m == 12 and d in [6, 13]) or (m == 1 and d in [17, 24, 31]):
+        return [2, 3, 4, 5]
+
+    return []
+
+# ==========================================
+# 2. データ処理・計算ロジック
+# ==========================================
+DEFAULT_RULES = [{"type": "max_per_day", "limit": 3}]
+
+# 各制約は (生徒チェック, 科目チェック, 割当通知) の3関数にコンパイルする。
+# チェックは割当のたびに更新するカウンタを参照するだけなので O(1) で済む。
+# コマごとの生徒 (cs.slot_students) と生徒の日ごとのコマ数 (cs.daily_counts) は
+# ConstraintSet が持つ共通カウンタを参照し、ルールごとに同じ情報を持たない。
+def _compile_no_duplicate(rule, cs):
+    def check(s, d, p): return s not in cs.slot_students.get((d, p), ())
+    return check, None, None
+
+def _compile_max_per_day(rule, cs):
+    limit = int(rule["limit"])
+    def check(s, d, p): return cs.daily_counts[(s, d)] < limit
+    return check, None, None
+
+def _compile_max_subject_per_day(rule, cs):
+    limit = int(rule["limit"])
+    counts = Counter()
+    def check_subject(s, d, p, subj): return counts[(s, d, subj)] < limit
+    def place(s, d, p, subj): counts[(s, d, subj)] += 1
+    return None, check_subject, place
+
+def _compile_max_consecutive(rule, cs):
+    """連続コマ数の上限 (上限に達したら間に空きコマが必要)"""
+    limit = int(rule["limit"])
+    def taken(s, d, q): return s in cs.slot_students.get((d, q), ())
+    def check(s, d, p):
+        run = 1
+        q = p - 1
+        while taken(s, d, q): run += 1; q -= 1
+        q = p + 1
+        while taken(s, d, q): run += 1; q += 1
+        return run <= limit
+    return check, None, None
+
+def _compile_ng_pair(rule, cs):
+    """同じコマに入れない生徒ペア"""
+    partners = {}
+    for a, b in rule["pairs"]:
+        partners.setdefault(a, set()).add(b)
+        partners.setdefault(b, set()).add(a)
+    def check(s, d, p):
+        in_slot = cs.slot_students.get((d, p), ())
+        return not any(other in in_slot for other in partners.get(s, ()))
+    return check, None, None
+
+def _compile_max_days_per_week(rule, cs):
+    limit = int(rule["limit"])
+    week_days = Counter()
+    def check(s, d, p):
+        if cs.daily_counts[(s, d)] > 0: return True
+        return week_days[(s, d.isocalendar()[:2])] < limit
+    def place(s, d, p, subj):
+        # 共通カウンタの更新前に呼ばれるので、0 ならその日の初回
+        if cs.daily_counts[(s, d)] == 0: week_days[(s, d.isocalendar()[:2])] += 1
+    return check, None, place
+
+CONSTRAINT_COMPILERS = {
+    "no_duplicate": _compile_no_duplicate,
+    "max_per_day": _compile_max_per_day,
+    "max_subject_per_day": _compile_max_subject_per_day,
+    "max_consecutive": _compile_max_consecutive,
+    "ng_pair": _compile_ng_pair,
+    "max_days_per_week": _compile_max_days_per_week,
+}
+
+class ConstraintSet:
+    """
+    宣言的なルール定義 (辞書のリスト) をコンパイルした実行時チェッカー。
+    どの割当エンジンからも allows / pick_subject / place だけで利用でき、
+    優先度計算には共通カウンタ slot_students / daily_counts をそのまま参照できる。
+    """
+    def __init__(self, rules):
+        self.slot_students = {}  # (日付, 講) -> そのコマの生徒名の集合
+        self.daily_counts = Counter()  # (生徒, 日付) -> その日のコマ数
+        self.checks, self.subject_checks, self.placers = [], [], []
+        # 同じコマへの重複割当は常に禁止
+        for rule in [{"type": "no_duplicate"}] + list(rules):
+            compiler = CONSTRAINT_COMPILERS.get(rule["type"])
+            if compiler is None:
+                raise ValueError(f"未対応のルールです: {rule['type']}")
+            check, check_subject, place = compiler(rule, self)
+            if check: self.checks.append(check)
+            if check_subject: self.subject_checks.append(check_subject)
+            if place: self.placers.append(place)
+
+    def allows(self, s, d, p):
+        return all(check(s, d, p) for check in self.checks)
+
+    def pick_subject(self, s, d, p, reqs):
+        """残り希望数が最も多い科目のうち、ルールを満たすものを選ぶ"""
+        items = [(v, k) for k, v in reqs.items() if v > 0]
+        if not self.subject_checks:
+            return max(items)[1] if items else None
+        for v, subj in sorted(items, reverse=True):
+            if all(check(s, d, p, subj) for check in self.subject_checks):
+                return subj
+        return None
+
+    def place(self, s, d, p, subj):
+        for place in self.placers: place(s, d, p, subj)
+        self.slot_students.setdefault((d, p), set()).add(s)
+        self.daily_counts[(s, d)] += 1
+
+def compile_problem(teacher_weekly_data, req_df, student_weekly_data, rules=None):
+    """
+    入力グリッドを解析し、計算用の問題データ(辞書)に変換する。
+    シナリオ比較ではこの結果を共有し、グリッドの再解析を省く。
+    """
+    # A. 先生シフト解析
+    teacher_capacity = {}
+    
+    for week_label, df in teacher_weekly_data.items():
+        for date_str in df.columns:
+            match = re.search(r"(\d+)/(\d+)", date_str)
+            if not match: continue
+            m, d = int(match.group(1)), int(match.group(2))
+            y = 2025 if m == 12 else 2026
+            try: d_date = datetime.date(y, m, d)
+            except: continue
+            
+            open_periods = get_open_periods(d_date)
+            
+            for p in range(1, 7):
+                try: val = str(df.loc[p, date_str])
+                except: continue
+                
+                if p not in open_periods: continue
+                
+                if any(x in val for x in ["〇", "○", "OK", "全"]):
+                    teacher_capacity[(d_date, p)] = 2
+                elif any(x in val for x in ["△", "▲", "半", "1"]):
+                    teacher_capacity[(d_date, p)] = 1
+
+    # B. 生徒データ解析
+    student_reqs = {}
+    for _, row in req_df.iterrows():
+        name = row['生徒名']
+        student_reqs[name] = {k: int(row.get(k, 0)) for k in SUBJECTS}
+
+    # C. 生徒シフト解析
+    student_availability = {}
+    for s_name, weekly_data in student_weekly_data.items():
+        if not weekly_data: continue
+        for week_label, df in weekly_data.items():
+            for date_str in df.columns:
+                match = re.search(r"(\d+)/(\d+)", date_str)
+                if not match: continue
+                m, d = int(match.group(1)), int(match.group(2))
+                y = 2025 if m == 12 else 2026
+                try: d_date = datetime.date(y, m, d)
+                except: continue
+                
+                for p in range(1, 7):
+                    try: val = str(df.loc[p, date_str])
+                    except: continue
+                    
+                    if any(x in val for x in ["〇", "○", "OK", "△", "▲", "1", "2", "3", "全"]):
+                        student_availability[(s_name, d_date, p)] = True
+                    else:
+                        student_availability[(s_name, d_date, p)] = False
+
+    return {
+        "capacity": teacher_capacity,
+        "reqs": student_reqs,
+        "availability": student_availability,
+        "rules": DEFAULT_RULES if rules is None else rules,
+    }
+
+def solve_schedule(problem, existing_schedule_map=None):
+    """compile_problem の結果から時間割を作成する (問題データは変更しない)"""
+    student_availability = problem["availability"]
+
+    # 全スロット作成
+    all_slots = []
+    for (d, p), cap in problem["capacity"].items():
+        if cap > 0: all_slots.append((d, p, cap))
+
+    students = {}
+    for name, reqs in problem["reqs"].items():
+        reqs = dict(reqs)
+        students[name] = {"reqs": reqs, "remaining": sum(reqs.values())}
+
+    # D. 計算準備
+    schedule_map = { (d, p): [] for d, p, cap in all_slots }
+    date_counts = Counter()
+    # 生徒ごとの割当状況はルール判定と優先度計算で ConstraintSet の共通カウンタを共有する
+    constraints = ConstraintSet(problem.get("rules", DEFAULT_RULES))
+
+    if existing_schedule_map:
+        for (d, p), assigned_list in existing_schedule_map.items():
+            if (d, p) in schedule_map:
+                schedule_map[(d, p)] = assigned_list[:] 
+                if len(assigned_list) > 0:
+                    date_counts[d] += len(assigned_list)
+                for entry in assigned_list:
+                    s_name = entry.split("(")[0]
+                    subj = entry[len(s_name) + 1:].rstrip(")")
+                    constraints.place(s_name, d, p, subj)
+
+    random.seed(42)
+    max_loops = 3000
+    loop_count = 0
+
+    while loop_count < max_loops:
+        loop_count += 1
+        assigned_in_this_loop = False
+        
+        def get_slot_priority(slot):
+            d, p, cap = slot
+            current_assigned = schedule_map[(d, p)]
+            current_len = len(current_assigned)
+            
+            if current_len >= cap: return -99999
+            
+            score = 0
+            if current_len == 1 and cap == 2:
+                score += 5000 
+
+            if len(schedule_map.get((d, p-1), [])) > 0: score += 100
+            if len(schedule_map.get((d, p+1), [])) > 0: score += 100
+            
+            score += date_counts[d] * 10
+            score += random.random()
+            return score
+
+        all_slots.sort(key=get_slot_priority, reverse=True)
+
+        for d, p, cap in all_slots:
+            current_assigned = schedule_map[(d, p)]
+            if len(current_assigned) >= cap: continue
+
+            candidates = {}
+            for s_name, data in students.items():
+                if data["remaining"] <= 0: continue
+                if not student_availability.get((s_name, d, p), False): continue
+                if not constraints.allows(s_name, d, p): continue
+
+                # 科目ルールがなければ科目は選ばれた生徒の分だけ後で決める
+                subj = None
+                if constraints.subject_checks:
+                    subj = constraints.pick_subject(s_name, d, p, data["reqs"])
+                    if subj is None: continue
+                candidates[s_name] = subj
+            
+            if not candidates: continue
+
+            def get_student_priority(s_name):
+                p_score = 0
+                if s_name in constraints.slot_students.get((d, p-1), ()): p_score += 20000
+                if s_name in constraints.slot_students.get((d, p+1), ()): p_score += 20000
+
+                if constraints.daily_counts[(s_name, d)] > 0:
+                    p_score += 500
+                
+                p_score += students[s_name]["remaining"] * 10
+                p_score += random.random()
+                return p_score
+
+            s = max(candidates, key=get_student_priority)
+            subj = candidates[s] or constraints.pick_subject(s, d, p, students[s]["reqs"])
+
+            students[s]["reqs"][subj] -= 1
+            students[s]["remaining"] -= 1
+            date_counts[d] += 1
+            constraints.place(s, d, p, subj)
+            
+            schedule_map[(d, p)].append(f"{s}({subj})")
+            assigned_in_this_loop = True
+            break
+        
+        if not assigned_in_this_loop: break
+
+    all_dates = sorted(list(set([x[0] for x in all_slots])))
+    unscheduled = []
+    for s, data in students.items():
+        for subj, cnt in data["reqs"].items():
+            if cnt > 0: unscheduled.append({"生徒名": s, "科目": subj, "不足": cnt})
+    
+    return schedule_map, all_dates, unscheduled
+
+# ==========================================
+# 2-2. シナリオ比較 (What-if)
+# ==========================================
+def apply_scenario(problem, delta):
+    """
+    ベースの問題データに差分(delta)を適用した新しい問題データを返す。
+    delta = {"reqs": {(生徒, 科目): 増減}, "availability": {(生徒, 日付, 講): bool},
+             "capacity": {(日付, 講): 定員}}
+    """
+    reqs = {name: dict(r) for name, r in problem["reqs"].items()}
+    for (s_name, subj), diff in delta.get("reqs", {}).items():
+        r = reqs.setdefault(s_name, {k: 0 for k in SUBJECTS})
+        r[subj] = max(0, r.get(subj, 0) + diff)
+
+    availability = problem["availability"]
+    if delta.get("availability"):
+        availability = dict(availability)
+        availability.update(delta["availability"])
+
+    capacity = problem["capacity"]
+    if delta.get("capacity"):
+        capacity = dict(capacity)
+        capacity.update(delta["capacity"])
+
+    return {"capacity": capacity, "reqs": reqs, "availability": availability, "rules": problem["rules"]}
+
+def displace_existing(existing_schedule_map, delta):
+    """
+    差分によって入れなくなった既存授業 (アップロードした時間割の授業) を取り除く。
+    コーチの定員を超えた分と、生徒が休みになったコマの授業が対象。
+    戻り値: (残った既存時間割, 取り除いた授業数)
+    """
+    if not existing_schedule_map: return existing_schedule_map, 0
+    capacity = delta.get("capacity", {})
+    availability = delta.get("availability", {})
+    if not capacity and not availability: return existing_schedule_map, 0
+
+    kept_map = {}
+    displaced = 0
+    for (d, p), assigned_list in existing_schedule_map.items():
+        kept = [e for e in assigned_list if availability.get((e.split("(")[0], d, p), True)]
+        if (d, p) in capacity:
+            kept = kept[:capacity[(d, p)]]
+        displaced += len(assigned_list) - len(kept)
+        kept_map[(d, p)] = kept
+    return kept_map, displaced
+
+def summarize_schedule(schedule_map, unscheduled, displaced=0):
+    """シナリオ比較用の指標 (割当数・未消化数・空きコマ数) を集計する"""
+    periods_by_student_day = {}
+    for (d, p), assigned_list in schedule_map.items():
+        for entry in assigned_list:
+            s_name = entry.split("(")[0]
+            periods_by_student_day.setdefault((s_name, d), []).append(p)
+
+    placed = sum(len(ps) for ps in periods_by_student_day.values())
+    # 空きコマ: 同じ日の最初と最後の授業の間で授業がないコマ数 (少ないほどコンパクト)
+    gaps = sum(max(ps) - min(ps) + 1 - len(set(ps)) for ps in periods_by_student_day.values())
+    return {
+        "割当コマ数": placed,
+        "未消化コマ数": sum(u["不足"] for u in unscheduled),
+        "移動が必要な既存授業": displaced,
+        "空きコマ数": gaps,
+        "通塾日数": len(periods_by_student_day),
+    }
+
+def run_scenario(problem, existing_schedule_map, delta):
+    existing_schedule_map, displaced = displace_existing(existing_schedule_map, delta)
+    schedule_map, _, unscheduled = solve_schedule(apply_scenario(problem, delta), existing_schedule_map)
+    return summarize_schedule(schedule_map, unscheduled, displaced)
+
+# ワーカープロセス内だけで使うベース問題 (initializer で各ワーカーに1回だけ設定する)
+_worker_base = None
+
+def init_scenario_worker(problem, existing_schedule_map):
+    global _worker_base
+    _worker_base = (problem, existing_schedule_map)
+
+def run_scenario_in_worker(delta):
+    problem, existing_schedule_map = _worker_base
+    return run_scenario(problem, existing_schedule_map, delta)